@@ -7,18 +7,32 @@ Designed to be run every 30 minutes (systemd timer / cron) using --once,
 or run as a daemon (no --once).
 """
 
+import io
 import os
+import sys
 import time
+import queue
+import ssl
+import socket
+import asyncio
+import ipaddress
 import logging
-import subprocess
+import logging.handlers
 from datetime import datetime
-from typing import Tuple, Dict, List
-import concurrent.futures
+from typing import Tuple, Dict, List, Optional
 import json
 from pathlib import Path
 
-import requests
-from requests.exceptions import RequestException, Timeout, ConnectionError
+import aiohttp
+import yarl
+try:
+    import icmplib  # unprivileged ICMP sockets, no fork per ping
+except ImportError:
+    icmplib = None
+try:
+    import orjson  # faster state file (de)serialization
+except ImportError:
+    orjson = None
 import smtplib
 from email.message import EmailMessage
 
@@ -35,7 +49,11 @@ URLS_FILE = os.getenv("MONITOR_URLS_FILE", str(SRC_DIR / "urls.txt"))
 CHECK_TIMEOUT = int(os.getenv("MONITOR_HTTP_TIMEOUT", "10"))
 HTTP_RETRIES = int(os.getenv("MONITOR_HTTP_RETRIES", "2"))
 RETRY_DELAY = int(os.getenv("MONITOR_RETRY_DELAY", "2"))
-CONCURRENCY = int(os.getenv("MONITOR_CONCURRENCY", "10"))  # thread pool size
+CONCURRENCY = int(os.getenv("MONITOR_CONCURRENCY", "10"))  # max open connections
+
+# DNS answers are cached for the daemon's lifetime, but an answer only
+# survives to the next run if this is >= MONITOR_INTERVAL_SECONDS
+DNS_CACHE_TTL = int(os.getenv("MONITOR_DNS_CACHE_TTL", "300"))  # seconds
 
 # logs/state inside data dir (writable)
 LOG_FILE = os.getenv("MONITOR_LOG_FILE", str(DATA_DIR / "website_monitor_multi.log"))
@@ -47,6 +65,10 @@ SMTP_USER = os.getenv("MONITOR_SMTP_USER", "")
 SMTP_PASS = os.getenv("MONITOR_SMTP_PASS", "")
 EMAIL_FROM = os.getenv("MONITOR_EMAIL_FROM", SMTP_USER)
 EMAIL_TO = os.getenv("MONITOR_EMAIL_TO", EMAIL_FROM)  # comma separated list
+_RECIPIENTS = tuple(r.strip() for r in EMAIL_TO.split(",") if r.strip())
+_RECIPIENTS_HEADER = ", ".join(_RECIPIENTS)
+# keep one logged-in SMTP connection open between runs (daemon mode)
+SMTP_PERSIST = os.getenv("MONITOR_SMTP_PERSIST", "false").lower() in ("1","true","yes")
 
 SEND_ON_EVERY_FAILURE = os.getenv("MONITOR_SEND_ON_EVERY_FAILURE", "false").lower() in ("1","true","yes")
 # if false => only send on state transitions
@@ -55,224 +77,532 @@ SEND_ON_EVERY_FAILURE = os.getenv("MONITOR_SEND_ON_EVERY_FAILURE", "false").lowe
 INTERVAL_SECONDS = int(os.getenv("MONITOR_INTERVAL_SECONDS", str(30*60)))
 
 # ---------- Logging ----------
+class UTCFormatter(logging.Formatter):
+    """
+    asctime in UTC at second resolution; the strftime result is cached so
+    records within the same second don't re-format it.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_sec = -1
+        self._last_str = ""
+
+    def formatTime(self, record, datefmt=None):
+        sec = int(record.created)
+        if sec != self._last_sec:
+            self._last_str = time.strftime("%Y-%m-%d %H:%M:%SZ", time.gmtime(sec))
+            self._last_sec = sec
+        return self._last_str
+
 # write to stdout (container logs) + file inside DATA_DIR
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
+formatter = UTCFormatter("%(asctime)s %(levelname)s %(message)s")
 
 # stdout handler
 sh = logging.StreamHandler()
 sh.setFormatter(formatter)
-logger.addHandler(sh)
+log_handlers = [sh]
 
-# file handler
+# file handler (WatchedFileHandler reopens the file if logrotate moves it)
+fh_error = None
 try:
-    fh = logging.FileHandler(LOG_FILE)
+    fh = logging.handlers.WatchedFileHandler(LOG_FILE)
     fh.setFormatter(formatter)
-    logger.addHandler(fh)
+    log_handlers.append(fh)
 except Exception:
-    logger.exception("Unable to create file handler for log; continuing with stdout only")
+    fh_error = sys.exc_info()
 
-# alias logging
-logging = logger
+# QueueHandler renders the message and traceback in the calling thread, then
+# enqueues it; a single listener thread applies the formatters and does all I/O
+log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+listener = logging.handlers.QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+listener.start()
 
+if fh_error:
+    logger.error("Unable to create file handler for log; continuing with stdout only", exc_info=fh_error)
 
-# ---------- Logging ----------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s",
-    handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()]
-)
+log = logging.getLogger(__name__)
 
 # ---------- Helpers ----------
-def load_urls(path: str) -> List[str]:
-    if not os.path.exists(path):
-        logging.error("URLs file not found: %s", path)
+# parsed urls file, reused until its mtime changes
+_URLS_CACHE = {"mtime": -1, "urls": []}
+
+def url_host(url: str) -> str:
+    """Host part of url; a malformed url falls back to itself and fails its own check."""
+    try:
+        return yarl.URL(url).host or url
+    except ValueError:
+        return url
+
+def load_urls(path: str) -> List[Tuple[str,str]]:
+    """Returns (url, host) entries; hosts are parsed once per file change, not per check."""
+    try:
+        st = os.stat(path)
+        if st.st_mtime_ns == _URLS_CACHE["mtime"]:
+            return _URLS_CACHE["urls"]
+        text = Path(path).read_text()
+    except FileNotFoundError:
+        log.error("URLs file not found: %s", path)
         return []
-    with open(path, "r") as f:
-        lines = [l.strip() for l in f.readlines()]
-    # remove blank lines and comments
-    return [l for l in lines if l and not l.startswith("#")]
+    # single pass: strip, drop blank lines and comments
+    urls = [(u, url_host(u)) for line in text.splitlines()
+            if (u := line.strip()) and not u.startswith("#")]
+    _URLS_CACHE["mtime"] = st.st_mtime_ns
+    _URLS_CACHE["urls"] = urls
+    return urls
+
+# host -> (address, monotonic expiry) for the ping path; lives as long as the
+# process, so entries carry over between daemon runs until DNS_CACHE_TTL expires
+_DNS_CACHE: Dict[str, Tuple[str, float]] = {}
+_DNS_CACHE_SIZE = 1024
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
 
-def icmp_ping(host: str, count: int = 1, timeout: int = 2) -> bool:
+async def resolve(host: str) -> Optional[str]:
+    """Return a cached address for host, or None if the lookup fails."""
+    if _is_ip(host):
+        # IP literal: nothing to resolve or cache
+        return host
+    now = time.monotonic()
+    hit = _DNS_CACHE.get(host)
+    if hit and hit[1] > now:
+        return hit[0]
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        # UnicodeError: IDNA rejects names yarl accepts, e.g. empty labels (a..b)
+        return None
+    addr = infos[0][4][0]
+    if len(_DNS_CACHE) >= _DNS_CACHE_SIZE:
+        # evict the oldest insertion
+        _DNS_CACHE.pop(next(iter(_DNS_CACHE)))
+    _DNS_CACHE[host] = (addr, now + DNS_CACHE_TTL)
+    return addr
+
+async def icmp_ping(host: str, count: int = 1, timeout: int = 2) -> bool:
     try:
         import platform
         plat = platform.system().lower()
         if plat == "windows":
             cmd = ["ping", "-n", str(count), "-w", str(timeout * 1000), host]
         else:
-            cmd = ["ping", "-c", str(count), "-W", str(timeout), host]
-        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+            # -n: numeric output, never reverse-resolve the target
+            cmd = ["ping", "-n", "-c", str(count), "-W", str(timeout), host]
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        return await proc.wait() == 0
     except Exception:
         return False
 
-def http_check(url: str, timeout: int = CHECK_TIMEOUT, retries: int = HTTP_RETRIES) -> Tuple[bool,int,str]:
+_icmp_sockets_ok: Optional[bool] = None
+
+def icmp_sockets_usable() -> bool:
+    """
+    Probe once whether unprivileged ICMP sockets are allowed
+    (net.ipv4.ping_group_range). When they aren't, async_multiping fails one
+    task per address and only the first failure is ever retrieved.
+    """
+    global _icmp_sockets_ok
+    if _icmp_sockets_ok is None:
+        try:
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+            _icmp_sockets_ok = True
+        except OSError:
+            _icmp_sockets_ok = False
+    return _icmp_sockets_ok
+
+async def icmp_ping_bounded(sem: asyncio.Semaphore, host: str) -> bool:
+    async with sem:
+        return await icmp_ping(host)
+
+async def fping(addrs: List[str], timeout: int = 2) -> Dict[str,bool]:
+    """
+    Ping every address with a single fping process.
+    Raises OSError when fping can't be run (not installed, not executable).
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "fping", "-q", "-c1", "-t", str(timeout * 1000), *addrs,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, err = await proc.communicate()
+    alive = {}
+    for line in (out + err).decode(errors="replace").splitlines():
+        # "<addr> : xmt/rcv/%loss = 1/1/0%, min/avg/max = ..."
+        name, sep, stats = line.partition(" : ")
+        if not sep or "xmt/rcv" not in stats:
+            continue
+        counts = stats.split("=", 1)[1].split(",", 1)[0].strip()
+        alive[name.strip()] = counts.split("/")[1] != "0"
+    return {a: alive.get(a, False) for a in addrs}
+
+async def ping_hosts(hosts, batch_only: bool = False) -> Optional[Dict[str,bool]]:
+    """
+    Ping a batch of hosts at once, returns {host: alive}.
+    Prefers unprivileged ICMP sockets (icmplib), then one fping process,
+    and only falls back to one ping process per host. With batch_only,
+    returns None instead of taking that per-host fallback.
+    """
+    global _icmp_sockets_ok
+    hosts = list(hosts)
+    if not hosts:
+        return {}
+    # ping cached addresses so the pinger doesn't do its own lookups; a host
+    # that doesn't resolve is dead and stays out of the batch, otherwise one
+    # bad name would fail the whole multiping
+    resolved = dict(zip(hosts, await asyncio.gather(*(resolve(h) for h in hosts))))
+    addrs = {h: a for h, a in resolved.items() if a is not None}
+    unique = list(set(addrs.values()))
+    if not unique:
+        return {h: False for h in hosts}
+
+    alive = None
+    if icmplib is not None and icmp_sockets_usable():
+        try:
+            replies = await icmplib.async_multiping(unique, count=1, timeout=2, privileged=False)
+            alive = {r.address: r.is_alive for r in replies}
+        except icmplib.SocketPermissionError:
+            # the probe passed but the kernel still refused; don't try again
+            _icmp_sockets_ok = False
+        except icmplib.ICMPLibError:
+            pass
+    if alive is None:
+        try:
+            alive = await fping(unique)
+        except OSError:
+            if batch_only:
+                return None
+            # one ping process per address; bound how many run at once
+            sem = asyncio.Semaphore(CONCURRENCY)
+            alive = dict(zip(unique, await asyncio.gather(*(icmp_ping_bounded(sem, a) for a in unique))))
+    return {h: alive.get(addrs.get(h), False) for h in hosts}
+
+async def http_check_async(session: aiohttp.ClientSession, url: str, retries: int = HTTP_RETRIES) -> Tuple[bool,int,str]:
+    """timeouts are enforced per socket operation by the session's ClientTimeout"""
     last_status = 0
     last_err = ""
     for attempt in range(1, retries+1):
         try:
-            resp = requests.get(url, timeout=timeout)
-            last_status = resp.status_code
-            if 200 <= resp.status_code < 300:
-                return True, resp.status_code, ""
+            # HEAD first: we only need the status line, not the body
+            async with session.head(url, allow_redirects=True) as resp:
+                status = resp.status
+            if status in (405, 501):
+                # server doesn't support HEAD; GET but never read the body
+                async with session.get(url) as resp:
+                    status = resp.status
+                    resp.close()
+            last_status = status
+            if 200 <= status < 400:
+                return True, status, ""
             else:
-                return False, resp.status_code, f"HTTP {resp.status_code}"
-        except (Timeout, ConnectionError) as e:
-            last_err = str(e)
-        except RequestException as e:
-            last_err = str(e)
+                return False, status, f"HTTP {status}"
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            # asyncio.TimeoutError has an empty message
+            last_err = str(e) or e.__class__.__name__
         if attempt < retries:
-            time.sleep(RETRY_DELAY)
+            await asyncio.sleep(RETRY_DELAY)
     return False, last_status, last_err or "Unknown error"
 
+def ping_label(ping) -> str:
+    if ping is None:
+        return "n/a"
+    return "OK" if ping else "NO"
+
+_smtp: Optional[smtplib.SMTP] = None
+
+def smtp_connect() -> smtplib.SMTP:
+    smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+    try:
+        smtp.ehlo()
+        if SMTP_PORT in (587, 25):
+            smtp.starttls()
+            smtp.ehlo()
+        smtp.login(SMTP_USER, SMTP_PASS)
+    except Exception:
+        smtp.close()
+        raise
+    return smtp
+
+def get_smtp() -> smtplib.SMTP:
+    """Returns the persistent connection, reconnecting if the server dropped it."""
+    global _smtp
+    if _smtp is not None:
+        try:
+            if _smtp.noop()[0] == 250:
+                return _smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+        close_smtp()
+    _smtp = smtp_connect()
+    return _smtp
+
+def close_smtp():
+    global _smtp
+    if _smtp is None:
+        return
+    try:
+        _smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        _smtp.close()
+    _smtp = None
+
 def send_email(subject: str, body: str):
-    recipients = [r.strip() for r in EMAIL_TO.split(",") if r.strip()]
-    if not SMTP_USER or not SMTP_PASS or not EMAIL_FROM or not recipients:
-        logging.error("SMTP not properly configured; skipping email")
+    if not SMTP_USER or not SMTP_PASS or not EMAIL_FROM or not _RECIPIENTS:
+        log.error("SMTP not properly configured; skipping email")
         return
     msg = EmailMessage()
     msg["From"] = EMAIL_FROM
-    msg["To"] = ", ".join(recipients)
+    msg["To"] = _RECIPIENTS_HEADER
     msg["Subject"] = subject
     msg.set_content(body)
 
     try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
-            smtp.ehlo()
-            if SMTP_PORT in (587, 25):
-                smtp.starttls()
-                smtp.ehlo()
-            smtp.login(SMTP_USER, SMTP_PASS)
-            smtp.send_message(msg)
-        logging.info("Email sent: %s", subject)
+        if SMTP_PERSIST:
+            try:
+                get_smtp().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # dropped between the NOOP and the send; reconnect once
+                close_smtp()
+                get_smtp().send_message(msg)
+        else:
+            with smtp_connect() as smtp:
+                smtp.send_message(msg)
+        log.info("Email sent: %s", subject)
     except Exception:
-        logging.exception("Failed to send email")
+        log.exception("Failed to send email")
 
 # ---------- State persistence ----------
-def load_state(path: str) -> Dict[str,str]:
+# in memory a URL's state is (kind, status_text); the file keeps the
+# "OK" / "FAIL::<status_text>" strings
+UNKNOWN, OK, FAIL = 0, 1, 2
+UrlState = Tuple[int, str]
+NO_STATE: UrlState = (UNKNOWN, "")
+OK_STATE: UrlState = (OK, "")
+
+def decode_state(raw: Dict[str,str]) -> Dict[str,UrlState]:
+    state = {}
+    for url, value in raw.items():
+        if value == "OK":
+            state[url] = OK_STATE
+        elif value.startswith("FAIL::"):
+            state[url] = (FAIL, value[len("FAIL::"):])
+    return state
+
+def encode_state(state: Dict[str,UrlState]) -> Dict[str,str]:
+    return {url: "OK" if kind == OK else f"FAIL::{text}" for url, (kind, text) in state.items()}
+
+def load_state(path: str) -> Dict[str,UrlState]:
     try:
         if os.path.exists(path):
-            with open(path, "r") as f:
-                return json.load(f)
+            data = Path(path).read_bytes()
+            return decode_state(orjson.loads(data) if orjson else json.loads(data))
     except Exception:
-        logging.exception("Failed to read state file")
+        log.exception("Failed to read state file")
     return {}
 
-def save_state(path: str, state: Dict[str,str]):
+_state_dir_ready = False
+
+def save_state(path: str, state: Dict[str,UrlState], prev: Dict[str,UrlState] = None) -> bool:
+    """
+    Skips the write when state is unchanged from prev (the last state
+    actually written); otherwise replaces the file atomically.
+    Returns False if the write failed, so the caller keeps its old prev.
+    """
+    global _state_dir_ready
+    if state == prev:
+        return True
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w") as f:
-            json.dump(state, f)
+        if not _state_dir_ready:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        raw = encode_state(state)
+        if orjson:
+            data = orjson.dumps(raw)
+        else:
+            data = json.dumps(raw, separators=(",", ":")).encode()
+        tmp = path + ".tmp"
+        Path(tmp).write_bytes(data)
+        os.replace(tmp, path)
+        _state_dir_ready = True
+        return True
     except Exception:
-        logging.exception("Failed to write state file")
+        log.exception("Failed to write state file")
+        return False
 
 # ---------- Per-URL worker ----------
-def check_url(url: str) -> Tuple[str, dict]:
+async def check_url_async(session: aiohttp.ClientSession, entry: Tuple[str,str]) -> Tuple[Tuple[str,str], dict]:
     """
-    Returns (url, result_dict)
-    result_dict: {ok:bool, status_code:int, error:str, ping:bool}
+    entry is a (url, host) pair from load_urls
+    Returns (entry, result_dict)
+    result_dict: {ok:bool, status_code:int, error:str, ping:bool|None}
+    ping is filled in by perform_checks_async; it stays None for healthy
+    URLs when only per-host ping processes are available
+    Never raises: an unexpected error becomes a failed result
     """
-    url = url.strip()
-    host = requests.utils.urlparse(url).hostname or url
-    ping_ok = icmp_ping(host)
-    ok, status_code, err = http_check(url)
-    return url, {"ok": ok, "status_code": status_code, "error": err, "ping": ping_ok}
+    try:
+        ok, status_code, err = await http_check_async(session, entry[0])
+    except Exception as e:
+        log.exception("Worker failure for %s", entry[0])
+        ok, status_code, err = False, 0, str(e)
+    return entry, {"ok": ok, "status_code": status_code, "error": err, "ping": None}
+
+async def check_worker(session: aiohttp.ClientSession, entries, checked: list):
+    """
+    Pulls (index, entry) pairs off a shared iterator until it is exhausted,
+    so only a fixed number of checks is ever in flight regardless of
+    len(urls). Results land at their index, keeping urls.txt order.
+    """
+    for i, entry in entries:
+        checked[i] = await check_url_async(session, entry)
 
 # ---------- Orchestration ----------
-def perform_checks(urls: List[str], last_state: Dict[str,str]) -> Dict[str,str]:
+# alert rule for a failing URL, keyed by its previous kind
+ALERT_ALWAYS, ALERT_IF_CHANGED = 1, 2
+ALERT_ON_FAIL = {UNKNOWN: ALERT_ALWAYS, OK: ALERT_ALWAYS, FAIL: ALERT_IF_CHANGED}
+
+def make_session() -> aiohttp.ClientSession:
+    """
+    One pooled session for the lifetime of the process, so connections and
+    cached DNS answers survive between daemon iterations.
+    Must be called with the event loop running.
+    """
+    # honour the CA bundle overrides requests did (REQUESTS_CA_BUNDLE / CURL_CA_BUNDLE)
+    ssl_ctx = ssl.create_default_context(cafile=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE"))
+    # the connector caps open sockets across every in-flight check
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY, limit_per_host=4, use_dns_cache=True,
+                                     ttl_dns_cache=DNS_CACHE_TTL, keepalive_timeout=300, ssl=ssl_ctx)
+    # per socket operation, not total: a total timeout also counts time spent
+    # queued for a free connector slot, failing healthy sites behind slow ones
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=CHECK_TIMEOUT, sock_read=CHECK_TIMEOUT)
+    # trust_env: use HTTP(S)_PROXY / NO_PROXY like requests did
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, trust_env=True)
+
+async def perform_checks_async(session: aiohttp.ClientSession, urls: List[Tuple[str,str]],
+                               last_state: Dict[str,UrlState]) -> Dict[str,UrlState]:
     updated_state = last_state.copy()
     failures = []
     recoveries = []
     details = {}
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=CONCURRENCY) as ex:
-        future_to_url = {ex.submit(check_url, u): u for u in urls}
-        for fut in concurrent.futures.as_completed(future_to_url):
-            url = future_to_url[fut]
-            try:
-                u, res = fut.result()
-            except Exception as e:
-                logging.exception("Worker failure for %s", url)
-                res = {"ok": False, "status_code": 0, "error": str(e), "ping": False}
-                u = url
-
-            status_text = f"OK: HTTP {res['status_code']}" if res["ok"] else f"FAIL: {res['error'] or ('HTTP '+str(res['status_code']))}"
-            details[u] = {"status": status_text, "ping": res["ping"], "raw": res}
-
-            prev = last_state.get(u)
-            if res["ok"]:
-                if prev and prev.startswith("FAIL"):
-                    # transitioned to OK -> RECOVERY
-                    recoveries.append((u, prev, status_text))
-                updated_state[u] = "OK"
-            else:
-                # failure
-                send_alert = False
-                if SEND_ON_EVERY_FAILURE:
-                    send_alert = True
-                else:
-                    if not prev:
-                        send_alert = True
-                    elif prev.startswith("OK"):
-                        send_alert = True
-                    elif prev.startswith("FAIL") and prev != status_text:
-                        send_alert = True
-                if send_alert:
-                    failures.append((u, status_text))
-                updated_state[u] = f"FAIL::{status_text}"
+    # speculative batch ping of every host, overlapped with the HTTP checks so
+    # a dead host costs max(ping, http) rather than ping + http; only done when
+    # a batch pinger exists, never with one forked ping per healthy host
+    ping_task = asyncio.create_task(ping_hosts({host for _, host in urls}, batch_only=True))
+
+    checked = [None] * len(urls)
+    # one worker per connector slot: no task per URL, and no check ever
+    # queues for a connection another worker holds
+    entries = enumerate(urls)
+    await asyncio.gather(*(check_worker(session, entries, checked) for _ in range(CONCURRENCY)))
+
+    # ping is diagnostic only: a failure here must not cost the run its
+    # alerts and state, so every URL just reports ping=n/a
+    try:
+        ping_results = await ping_task
+        if ping_results is None:
+            # per-process fallback: only ping hosts whose HTTP check failed
+            ping_results = await ping_hosts({host for (_, host), res in checked if not res["ok"]})
+    except Exception:
+        log.exception("Ping failed; reporting ping=n/a for this run")
+        ping_results = {}
+
+    for (u, host), res in checked:
+        res["ping"] = ping_results.get(host)
+
+        status_text = f"OK: HTTP {res['status_code']}" if res["ok"] else f"FAIL: {res['error'] or ('HTTP '+str(res['status_code']))}"
+        details[u] = {"status": status_text, "ping": res["ping"], "raw": res}
+
+        prev_kind, prev_text = last_state.get(u, NO_STATE)
+        if res["ok"]:
+            if prev_kind == FAIL:
+                # transitioned to OK -> RECOVERY
+                recoveries.append((u, prev_text, status_text))
+            updated_state[u] = OK_STATE
+        else:
+            # failure
+            send_alert = (SEND_ON_EVERY_FAILURE
+                          or ALERT_ON_FAIL[prev_kind] == ALERT_ALWAYS
+                          or prev_text != status_text)
+            if send_alert:
+                failures.append((u, status_text))
+            updated_state[u] = (FAIL, status_text)
 
     # Build aggregated email(s)
     now = datetime.utcnow().isoformat() + "Z"
     if failures or recoveries:
-        body_lines = [f"Monitor run time (UTC): {now}", "", "Summary:"]
+        buf = io.StringIO()
+        w = buf.write
+        w(f"Monitor run time (UTC): {now}\n\nSummary:\n")
         if failures:
-            body_lines.append(f"\nFailures ({len(failures)}):")
+            w(f"\nFailures ({len(failures)}):\n")
             for u, st in failures:
                 d = details.get(u, {})
                 ping = d.get("ping")
-                body_lines.append(f"- {u} -> {st} (ping={'OK' if ping else 'NO'})")
+                w(f"- {u} -> {st} (ping={ping_label(ping)})\n")
         if recoveries:
-            body_lines.append(f"\nRecoveries ({len(recoveries)}):")
+            w(f"\nRecoveries ({len(recoveries)}):\n")
             for u, prev, cur in recoveries:
                 d = details.get(u, {})
                 ping = d.get("ping")
-                body_lines.append(f"- {u} -> RECOVERED (now {cur}, prev {prev}, ping={'OK' if ping else 'NO'})")
+                w(f"- {u} -> RECOVERED (now {cur}, prev {prev}, ping={ping_label(ping)})\n")
 
         # include brief footer with instructions
-        body_lines.append("\nFull details (per-URL):")
+        w("\nFull details (per-URL):\n")
         for u, d in details.items():
-            body_lines.append(f"- {u} : {d['status']} (ping={'OK' if d['ping'] else 'NO'})")
+            w(f"- {u} : {d['status']} (ping={ping_label(d['ping'])})\n")
 
         subject = f"[ALERT] Monitor: {len(failures)} failures, {len(recoveries)} recoveries"
-        send_email(subject, "\n".join(body_lines))
+        send_email(subject, buf.getvalue())
     else:
-        logging.info("No failures or recoveries in this run.")
+        log.info("No failures or recoveries in this run.")
 
     return updated_state
 
 # ---------- Main loop ----------
-def main(run_once=False):
+async def run(run_once: bool):
     urls = load_urls(URLS_FILE)
     if not urls:
-        logging.error("No URLs to monitor; exiting")
+        log.error("No URLs to monitor; exiting")
         return
 
-    state = load_state(STATE_FILE)
-    state = perform_checks(urls, state)
-    save_state(STATE_FILE, state)
-
-    if run_once:
-        return
+    # a single event loop and session for the whole daemon, so pooled
+    # connections and DNS answers are reused across iterations
+    async with make_session() as session:
+        state = load_state(STATE_FILE)
+        # last state known to be on disk; a failed write must not advance it,
+        # or later unchanged runs would skip the retry and leave the file stale
+        saved = state
+        state = await perform_checks_async(session, urls, state)
+        if save_state(STATE_FILE, state, prev=saved):
+            saved = state
+
+        if run_once:
+            return
+
+        log.info("Daemon mode: sleeping %s seconds", INTERVAL_SECONDS)
+        while True:
+            await asyncio.sleep(INTERVAL_SECONDS)
+            try:
+                urls = load_urls(URLS_FILE)
+                state = await perform_checks_async(session, urls, state)
+                if save_state(STATE_FILE, state, prev=saved):
+                    saved = state
+            except Exception:
+                log.exception("Error during monitor loop")
 
-    logging.info("Daemon mode: sleeping %s seconds", INTERVAL_SECONDS)
-    while True:
-        time.sleep(INTERVAL_SECONDS)
-        try:
-            urls = load_urls(URLS_FILE)
-            state = perform_checks(urls, state)
-            save_state(STATE_FILE, state)
-        except Exception:
-            logging.exception("Error during monitor loop")
+def main(run_once=False):
+    try:
+        asyncio.run(run(run_once))
+    finally:
+        close_smtp()
+        # flush queued log records before exit
+        listener.stop()
 
 if __name__ == "__main__":
     import argparse